@@ -25,6 +25,8 @@ __version__ = 0.1
 import re
 import logging
 import ipaddress
+from sys import intern
+from functools import lru_cache
 from collectors.os.modules.core import DomainCollector
 from collectors.os.modules.core import BaseCollector
 from collectors.os.modules.core import BaseHydra
@@ -44,10 +46,24 @@ from database.model import DnsResourceRecordType
 from database.model import ExecutionInfoType
 from view.core import ReportItem
 from typing import List
+from typing import Tuple
+from typing import Iterable
+from typing import Iterator
+from typing import Dict
 from sqlalchemy.orm.session import Session
 
 logger = logging.getLogger('dns.core')
 
+_RE_ENTRY = re.compile(r"^(?P<hostname>.+?)\.\s+\d+\s+IN\s+(?P<type>[A-Z]+)\s+(?:\d+\s)?(?P<content>.+)$",
+                       re.IGNORECASE)
+_ADDRESS_RR_TYPES = frozenset({DnsResourceRecordType.a, DnsResourceRecordType.aaaa})
+# resource record types whose data might contain domain names
+_DOMAIN_BEARING_RR_TYPES = frozenset({DnsResourceRecordType.ns,
+                                      DnsResourceRecordType.mx,
+                                      DnsResourceRecordType.ptr,
+                                      DnsResourceRecordType.soa,
+                                      DnsResourceRecordType.alias})
+
 
 class DnsServiceDescriptor(ServiceDescriptorBase):
     """This class describes how an DNS service looks like"""
@@ -398,14 +414,109 @@ class BaseCrobat(BaseDnsCollector):
             self._set_execution_failed(session, command)
 
 
+class ZoneTransferRecords:
+    """
+    This class collects the unique host names, addresses, and mappings of a zone transfer. each of them is mapped to the
+    first output line in which it occurred, so that invalid entries can be logged together with their origin.
+    """
+
+    def __init__(self, extract_domains):
+        self.host_names = {}
+        self.address_mappings = {}
+        self.cname_mappings = {}
+        self.extracted_names = {}
+        # zone transfers usually contain the same record data (e.g., name servers) many times
+        self._extract_domains = lru_cache(maxsize=4096)(extract_domains)
+
+    def add_owner(self, host_name: str, record_type: DnsResourceRecordType, content: str, line: str) -> None:
+        """
+        This method only collects the host name of records whose data is not further analysed (e.g., TXT records).
+        """
+        self.host_names.setdefault(host_name, line)
+
+    def add_address(self, host_name: str, record_type: DnsResourceRecordType, content: str, line: str) -> None:
+        """
+        This method collects A and AAAA records.
+        """
+        self.host_names.setdefault(host_name, line)
+        if content:
+            self.address_mappings.setdefault((host_name, content, record_type), line)
+
+    def add_cname(self, host_name: str, record_type: DnsResourceRecordType, content: str, line: str) -> None:
+        """
+        This method collects CNAME records.
+        """
+        self.host_names.setdefault(host_name, line)
+        if content:
+            self.cname_mappings.setdefault((host_name, content), line)
+
+    def add_domains(self, host_name: str, record_type: DnsResourceRecordType, content: str, line: str) -> None:
+        """
+        This method collects the domains contained in the data of records like NS, MX, or SOA.
+        """
+        self.host_names.setdefault(host_name, line)
+        domains = self._extract_domains(content)
+        if domains:
+            extracted_names = self.extracted_names.setdefault(host_name, {})
+            for item in domains:
+                extracted_names.setdefault(item, line)
+
+
+# maps the upper case resource record type to its enum value as well as the ZoneTransferRecords method that collects it
+_RR_DISPATCH = {item.name.upper(): (item, ZoneTransferRecords.add_owner) for item in DnsResourceRecordType}
+_RR_DISPATCH.update({item.name.upper(): (item, ZoneTransferRecords.add_domains) for item in _DOMAIN_BEARING_RR_TYPES})
+_RR_DISPATCH.update({item.name.upper(): (item, ZoneTransferRecords.add_address) for item in _ADDRESS_RR_TYPES})
+_RR_DISPATCH["CNAME"] = (DnsResourceRecordType.cname, ZoneTransferRecords.add_cname)
+
+
+def iter_zone_transfer_records(lines: Iterable[str]) -> Iterator[Tuple[str, str, str, str]]:
+    """
+    This function parses the given zone transfer output lines and yields a tuple (host name, upper case record type,
+    record data, line) for each record whose type is supported by _RR_DISPATCH.
+    """
+    # this loop runs once per line of the zone transfer. thus, we bind the module-level lookups to local names
+    rr_dispatch = _RR_DISPATCH
+    match_entry = _RE_ENTRY.match
+    for line in lines:
+        # skip empty lines and comments (e.g., ;; ANSWER SECTION:) before parsing
+        if not line or line[0] == ";":
+            continue
+        # zone transfer records are whitespace delimited (name, TTL, class, type, and data). thus, we split them
+        # directly and only fall back to the regular expression, if the line does not have this shape
+        parts = line.split(None, 4)
+        if len(parts) == 5 and parts[1].isdigit() and (parts[2] == "IN" or parts[2].upper() == "IN"):
+            # split does not return leading whitespace. thus, trimming the trailing characters is sufficient
+            host_name_str = parts[0].rstrip(".")
+            record_type_str = parts[3]
+            if record_type_str not in rr_dispatch:
+                record_type_str = record_type_str.upper()
+            content = parts[4].rstrip(". \t\r\n")
+        else:
+            # the regular expression requires the record class as a separate field that follows the numeric TTL and
+            # is followed by the type and data. thus, banners like Trying "megacorpone.com" or Received 723 bytes from
+            # 51.222.39.63#53 in 100 ms are skipped without applying it
+            if len(parts) < 5:
+                continue
+            fields = line.upper().split()
+            if not any(fields[i] == "IN" and fields[i - 1].isdigit() for i in range(2, len(fields) - 2)):
+                continue
+            match = match_entry(line)
+            if not match:
+                continue
+            host_name_str = match.group("hostname").strip(". ")
+            record_type_str = match.group("type").strip().upper()
+            content = match.group("content").strip().strip(". ")
+        if record_type_str in rr_dispatch:
+            # owner names repeat throughout a zone. interning them shares a single string object per owner name between
+            # the deduplication dictionaries
+            yield intern(host_name_str), record_type_str, content, line
+        else:
+            logger.debug("ignoring unsupported resource record type in line: {}".format(line))
+
+
 class BaseDnsAxfr(BaseDnsCollector):
     """This class implements the base class for zone transfers."""
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self._re_entry = re.compile("^(?P<hostname>.+?)\.\s+\d+\s+IN\s+(?P<type>[A-Z]+)\s+(\d+\s)?(?P<content>.+)$",
-                                    re.IGNORECASE)
-
     def verify_results(self, session: Session,
                        command: Command,
                        source: Source,
@@ -426,64 +537,98 @@ class BaseDnsAxfr(BaseDnsCollector):
         code etc.
         """
         command.hide = True
-        for line in command.stdout_output:
-            match = self._re_entry.match(line)
-            if match:
-                host_name_str = match.group("hostname").strip(". ")
-                record_type_str = match.group("type").strip().lower()
-                content = match.group("content").strip().strip(". ")
-                try:
-                    record_type = DnsResourceRecordType[record_type_str]
-                    host_name = self.add_host_name(session=session,
+        # first, we collect the unique host names, addresses, and mappings of the zone transfer. afterwards, we add each
+        # of them exactly once to the database. note that we use the add methods instead of bulk inserts (e.g., INSERT ON
+        # CONFLICT DO NOTHING) as these methods also verify the domains' scope, link the sources, merge the mapping
+        # types, and notify the report items
+        records = ZoneTransferRecords(extract_domains=self._domain_utils.extract_domains)
+        for host_name_str, record_type_str, content, line in iter_zone_transfer_records(command.stdout_output):
+            record_type, handler = _RR_DISPATCH[record_type_str]
+            handler(records, host_name_str, record_type, content, line)
+        # add the collected host names
+        host_names = self._add_host_names(session=session,
+                                          command=command,
+                                          items=records.host_names,
+                                          source=source,
+                                          report_item=report_item)
+        # add the collected IPv4/IPv6 addresses and link them to their host names
+        hosts = {}
+        for (host_name_str, address, record_type), line in records.address_mappings.items():
+            host_name = host_names[host_name_str]
+            if host_name:
+                if address not in hosts:
+                    hosts[address] = self.add_host(session=session,
                                                    command=command,
-                                                   host_name=host_name_str,
                                                    source=source,
+                                                   address=address,
                                                    report_item=report_item)
-                    if host_name:
-                        if record_type in [DnsResourceRecordType.a, DnsResourceRecordType.aaaa] and content:
-                            # Add IPv4 address to database
-                            host = self.add_host(session=session,
-                                                 command=command,
-                                                 source=source,
-                                                 address=content,
-                                                 report_item=report_item)
-                            if not host:
-                                logger.debug("ignoring host due to invalid IP address in line: {}".format(line))
-                            else:
-                                self.add_host_host_name_mapping(session=session,
-                                                                command=command,
-                                                                host=host,
-                                                                host_name=host_name,
-                                                                source=source,
-                                                                mapping_type=record_type,
-                                                                report_item=report_item)
-                        if record_type == DnsResourceRecordType.cname and content:
-                            cname_host_name = self.add_host_name(session=session,
-                                                                 command=command,
-                                                                 host_name=content,
-                                                                 source=source,
-                                                                 report_item=report_item)
-                            if cname_host_name:
-                                self.add_host_name_host_name_mapping(session=session,
-                                                                     command=command,
-                                                                     source_host_name=host_name,
-                                                                     resolved_host_name=cname_host_name,
-                                                                     source=source,
-                                                                     mapping_type=DnsResourceRecordType.cname,
-                                                                     report_item=report_item)
-                            else:
-                                logger.debug("ignoring host name due to invalid domain in line: {}".format(line))
-
-                        else:
-                            for item in self._domain_utils.extract_domains(content):
-                                host_name = self.add_host_name(session=session,
-                                                               command=command,
-                                                               host_name=item,
-                                                               source=source,
-                                                               report_item=report_item)
-                                if not host_name:
-                                    logger.debug("ignoring host name due to invalid domain in line: {}".format(line))
-                    else:
-                        logger.debug("ignoring host name due to invalid domain in line: {}".format(line))
-                except KeyError as ex:
-                    logger.exception(ex)
+                host = hosts[address]
+                if not host:
+                    logger.debug("ignoring host due to invalid IP address in line: {}".format(line))
+                else:
+                    self.add_host_host_name_mapping(session=session,
+                                                    command=command,
+                                                    host=host,
+                                                    host_name=host_name,
+                                                    source=source,
+                                                    mapping_type=record_type,
+                                                    report_item=report_item)
+        # add the collected CNAME records
+        cname_mappings = [(host_names[host_name_str], cname, line)
+                          for (host_name_str, cname), line in records.cname_mappings.items()
+                          if host_names[host_name_str]]
+        host_names.update(self._add_host_names(session=session,
+                                               command=command,
+                                               items={cname: line for _, cname, line in cname_mappings
+                                                      if cname not in host_names},
+                                               source=source,
+                                               report_item=report_item))
+        for host_name, cname, line in cname_mappings:
+            cname_host_name = host_names[cname]
+            if cname_host_name:
+                self.add_host_name_host_name_mapping(session=session,
+                                                     command=command,
+                                                     source_host_name=host_name,
+                                                     resolved_host_name=cname_host_name,
+                                                     source=source,
+                                                     mapping_type=DnsResourceRecordType.cname,
+                                                     report_item=report_item)
+        # add the host names that were extracted from the data of records like NS, MX, or SOA
+        extracted_names = {}
+        for host_name_str, items in records.extracted_names.items():
+            if host_names[host_name_str]:
+                for item, line in items.items():
+                    if item not in host_names:
+                        extracted_names.setdefault(item, line)
+        self._add_host_names(session=session,
+                             command=command,
+                             items=extracted_names,
+                             source=source,
+                             report_item=report_item)
+
+    def _add_host_names(self,
+                        session: Session,
+                        command: Command,
+                        items: Dict[str, str],
+                        source: Source,
+                        report_item: ReportItem) -> Dict[str, HostName]:
+        """
+        This method adds the given host names to the database.
+        :param session: Sqlalchemy session that manages persistence operations for ORM-mapped objects
+        :param command: The command instance that contains the results of the command execution
+        :param items: Dictionary that maps the host names that shall be added to the output line in which they occurred
+        :param source: The source object of the current collector
+        :param report_item: Item that can be used for reporting potential findings in the UI
+        :return: Dictionary that maps each given host name to its database object or None, if it is invalid
+        """
+        result = {}
+        for item, line in items.items():
+            host_name = self.add_host_name(session=session,
+                                           command=command,
+                                           host_name=item,
+                                           source=source,
+                                           report_item=report_item)
+            if not host_name:
+                logger.debug("ignoring host name due to invalid domain in line: {}".format(line))
+            result[item] = host_name
+        return result
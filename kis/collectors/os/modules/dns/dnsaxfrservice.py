@@ -23,6 +23,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 __version__ = 0.1
 
 import logging
+import weakref
 from typing import List
 from collectors.os.modules.dns.core import BaseDnsAxfr
 from collectors.os.modules.core import ServiceCollector
@@ -31,7 +32,7 @@ from database.model import DomainName
 from database.model import ScopeType
 from database.model import Service
 from database.model import CollectorName
-from sqlalchemy import or_
+from sqlalchemy import select
 from sqlalchemy.orm.session import Session
 
 logger = logging.getLogger('dnsaxfrservice')
@@ -44,6 +45,9 @@ class CollectorClass(BaseDnsAxfr, ServiceCollector):
         super().__init__(priority=1306,
                          timeout=0,
                          **kwargs)
+        # the in-scope domains do not change while the commands of a session are created. thus, we query them only once
+        # per session
+        self._inscope_domains_cache = weakref.WeakKeyDictionary()
 
     @staticmethod
     def get_argparse_arguments():
@@ -66,16 +70,25 @@ class CollectorClass(BaseDnsAxfr, ServiceCollector):
         """
         collectors = []
         if self.match_nmap_service_name(service) and not self._dns_server:
-            domain_name = session.query(DomainName).filter(or_(DomainName.scope == ScopeType.all,
-                                                               DomainName.scope == ScopeType.strict,
-                                                               DomainName.scope == ScopeType.vhost)).all()
-            for item in domain_name:
-                os_command = [self._path_host,
-                              "-{}".format(service.host.version),
+            names = self._inscope_domains_cache.get(session)
+            if names is None:
+                statement = select(DomainName.name).where(DomainName.scope.in_([ScopeType.all,
+                                                                                ScopeType.strict,
+                                                                                ScopeType.vhost]))
+                names = session.execute(statement).scalars().all()
+                self._inscope_domains_cache[session] = names
+            # the service's attributes are the same for all domains
+            path = self._path_host
+            version = "-{}".format(service.host.version)
+            port = service.port
+            address = service.address
+            for name in names:
+                os_command = [path,
+                              version,
                               "-t", "axfr",
-                              "-p", service.port,
-                              item.name,
-                              service.address]
+                              "-p", port,
+                              name,
+                              address]
                 collector = self._get_or_create_command(session, os_command, collector_name, service=service)
                 collectors.append(collector)
         return collectors
@@ -24,9 +24,11 @@ __version__ = 0.1
 
 import os
 import tempfile
+from unittest.mock import patch
 from typing import List
 from unittests.tests.collectors.kali.modules.dns.core import BaseKaliDnsCollectorTestCase
 from collectors.os.modules.dns.dnsaxfrservice import CollectorClass as DnsaxfrCollector
+from collectors.os.modules.dns.core import iter_zone_transfer_records
 from unittests.tests.collectors.core import CollectorProducerTestSuite
 from database.model import CollectorType
 from database.model import DnsResourceRecordType
@@ -127,3 +129,102 @@ Received 723 bytes from 51.222.39.63#53 in 100 ms""".split(os.linesep)
                                             host_name="www6.megacorpone.com")
             hosts = host_name.get_host_host_name_mappings([DnsResourceRecordType.aaaa])
             self.assertEqual("2a00:1450:400a:802::2004", hosts[0].host.ipv6_address)
+
+    def test_iter_zone_transfer_records(self):
+        """
+        This method checks whether the zone transfer output lines are correctly parsed
+        :return:
+        """
+        # blank and comment lines are skipped by the prefilter. banner lines do not have the record shape and do not
+        # contain the record class as a separate field
+        lines = ["Trying \"megacorpone.com\"",
+                 "",
+                 ";; ANSWER SECTION:",
+                 "Received 723 bytes from 51.222.39.63#53 in 100 ms",
+                 # tab separated line
+                 "megacorpone.com.\t300\tIN\tMX\t50 mail.megacorpone.com.",
+                 "www2.megacorpone.com.   300     IN      A       149.56.244.87",
+                 # owner name without trailing dot
+                 "www3.megacorpone.com 300 IN A 149.56.244.88",
+                 # lower case record class and type
+                 "megacorpone.com. 300 in ns ns1.megacorpone.com.",
+                 # unsupported record type
+                 "megacorpone.com. 300 IN RRSIG NS 8 2 300 20220101000000 20211201000000 12345 megacorpone.com. abc=",
+                 "megacorpone.com. 300 IN NS .",
+                 # line that does not have the whitespace delimited shape and is parsed by the regular expression
+                 "host name.megacorpone.com. 300 IN A 149.56.244.89"]
+        results = [item[:3] for item in iter_zone_transfer_records(lines)]
+        self.assertListEqual([("megacorpone.com", "MX", "50 mail.megacorpone.com"),
+                              ("www2.megacorpone.com", "A", "149.56.244.87"),
+                              ("www3.megacorpone.com", "A", "149.56.244.88"),
+                              ("megacorpone.com", "NS", "ns1.megacorpone.com"),
+                              ("megacorpone.com", "NS", ""),
+                              ("host name.megacorpone.com", "A", "149.56.244.89")], results)
+        # each result also contains the line from which it was parsed
+        self.assertListEqual([lines[4], lines[5], lines[6], lines[7], lines[9], lines[10]],
+                             [item[3] for item in iter_zone_transfer_records(lines)])
+
+    def test_verify_results_duplicates(self):
+        """
+        This method checks whether each unique host name, host, and mapping of duplicate records is added only once
+        :return:
+        """
+        self.init_db()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            test_suite = CollectorProducerTestSuite(engine=self._engine,
+                                                    arguments={"workspace": self._workspaces[0],
+                                                               "output_dir": temp_dir})
+            with self._engine.session_scope() as session:
+                source = self.create_source(session, source_str=self._collector_name)
+                command = self.create_command(session=session,
+                                              workspace_str=self._workspaces[0],
+                                              command=["host", "-t", "axfr", "-p", "53", "megacorpone.com", "51.222.39.63"],
+                                              collector_name_str=self._collector_name,
+                                              collector_name_type=CollectorType.host_service,
+                                              service_port=53,
+                                              scope=ScopeType.all,
+                                              output_path=temp_dir)
+                command.stdout_output = ["megacorpone.com.        300     IN      NS      ns1.megacorpone.com.",
+                                         "megacorpone.com.        300     IN      NS      ns1.megacorpone.com.",
+                                         "test.megacorpone.com.   300     IN      CNAME   cname.megacorpone.com.",
+                                         "test.megacorpone.com.   300     IN      CNAME   cname.megacorpone.com.",
+                                         "www2.megacorpone.com.   300     IN      A       149.56.244.87",
+                                         "www2.megacorpone.com.\t300\tIN\tA\t149.56.244.87"]
+                # the mocks wrap the original methods, so that the records are still added to the database
+                with patch.object(DnsaxfrCollector,
+                                  "add_host_name",
+                                  autospec=True,
+                                  side_effect=DnsaxfrCollector.add_host_name) as add_host_name, \
+                        patch.object(DnsaxfrCollector,
+                                     "add_host",
+                                     autospec=True,
+                                     side_effect=DnsaxfrCollector.add_host) as add_host, \
+                        patch.object(DnsaxfrCollector,
+                                     "add_host_host_name_mapping",
+                                     autospec=True,
+                                     side_effect=DnsaxfrCollector.add_host_host_name_mapping) as add_host_mapping, \
+                        patch.object(DnsaxfrCollector,
+                                     "add_host_name_host_name_mapping",
+                                     autospec=True,
+                                     side_effect=DnsaxfrCollector.add_host_name_host_name_mapping) as add_cname_mapping:
+                    test_suite.verify_results(session=session,
+                                              arg_parse_module=self._arg_parse_module,
+                                              command=command,
+                                              source=source,
+                                              report_item=self._report_item)
+                self.assertListEqual(["cname.megacorpone.com",
+                                      "megacorpone.com",
+                                      "ns1.megacorpone.com",
+                                      "test.megacorpone.com",
+                                      "www2.megacorpone.com"],
+                                     sorted([item.kwargs["host_name"] for item in add_host_name.call_args_list]))
+                self.assertListEqual(["149.56.244.87"], [item.kwargs["address"] for item in add_host.call_args_list])
+                self.assertEqual(1, add_host_mapping.call_count)
+                self.assertEqual(1, add_cname_mapping.call_count)
+        with self._engine.session_scope() as session:
+            host_name = self.query_hostname(session=session,
+                                            workspace_str=self._workspaces[0],
+                                            host_name="test.megacorpone.com")
+            mappings = host_name.resolved_host_name_mappings
+            self.assertEqual(1, len(mappings))
+            self.assertEqual("cname.megacorpone.com", mappings[0].resolved_host_name.full_name)